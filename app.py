@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import altair as alt
 
@@ -61,12 +62,197 @@ st.markdown(
 )
 
 # ---------------- HELPERS ----------------
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One keep-alive HTTP session reused across reruns and users."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+@st.cache_data(ttl=5, max_entries=1)
+def fetch_transactions() -> pd.DataFrame:
+    """
+    Recent transactions from the backend, reused across reruns for 5s.
+    Raises requests.RequestException if the backend is unreachable.
+    """
+    # NDJSON is parsed straight off the socket into a DataFrame
+    with get_session().get(f"{API_URL}/transactions/", timeout=5, stream=True) as res:
+        res.raise_for_status()
+        res.raw.decode_content = True
+        return pd.read_json(res.raw, lines=True)
+
+@st.cache_data(
+    max_entries=8,
+    hash_funcs={pd.DataFrame: lambda d: (len(d), d["anomaly_score"].sum())}
+)
+def anomaly_chart_spec(df: pd.DataFrame) -> dict:
+    """
+    Vega-Lite spec for the score histogram. Keyed on a cheap hash of the
+    score column, so Altair only rebuilds it when the scores change.
+    """
+    chart = (
+        alt.Chart(df[["anomaly_score"]])
+        .mark_bar(color="#22c55e")
+        .encode(
+            x=alt.X("anomaly_score:Q", bin=alt.Bin(maxbins=20)),
+            y=alt.Y("count()")
+        )
+        .properties(height=320)
+    )
+    return chart.to_dict()
+
 def status_badge(status: str):
     if status == "SUCCESS":
         st.success("Status: APPROVED")
     else:
         st.error("Status: REJECTED")
 
+# ---------------- TABS ----------------
+# Each tab is a fragment: widget interactions in one tab rerun only that
+# tab, so typing/submitting in Data Entry never refetches the dashboard.
+@st.fragment
+def render_data_entry():
+    with st.container(border=True):
+        st.subheader("Transaction Input")
+
+        col_input, col_preview = st.columns([1.6, 1], gap="large")
+
+        with col_input:
+            raw_text = st.text_area(
+                "Transaction Text",
+                height=150,
+                placeholder="Example: Sold 5 iPhone 15s to Client A"
+            )
+
+            if st.button("Process Transaction", use_container_width=True, type="primary"):
+                if not raw_text.strip():
+                    st.warning("Transaction text is required.")
+                    return
+
+                with st.spinner("AI parsing, validating, and scoring..."):
+                    res = get_session().post(
+                        f"{API_URL}/process/",
+                        json={"text": raw_text},
+                        timeout=10
+                    )
+
+                    if res.status_code != 200:
+                        st.error(f"Backend Error ({res.status_code})")
+                        return
+
+                    result = res.json()
+                    status_badge(result["status"])
+
+                    if result["status"] == "SUCCESS":
+                        # New row in the DB; drop the cached dashboard data
+                        fetch_transactions.clear()
+                        d = result["data"]
+
+                        c1, c2, c3 = st.columns(3)
+                        with c1:
+                            st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
+                            st.metric("Item", result["logs"]["parsed_json"]["item"])
+                            st.markdown('</div>', unsafe_allow_html=True)
+
+                        with c2:
+                            st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
+                            st.metric("Quantity", d["quantity"])
+                            st.markdown('</div>', unsafe_allow_html=True)
+
+                        with c3:
+                            st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
+                            st.metric("Total Value", f"${d['total_price']}")
+                            st.markdown('</div>', unsafe_allow_html=True)
+
+                        if d["is_flagged"]:
+                            st.markdown('<div class="metric-warning">', unsafe_allow_html=True)
+                            st.warning(f"Anomaly detected (Score: {d['anomaly_score']:.4f})")
+                            st.markdown('</div>', unsafe_allow_html=True)
+                        else:
+                            st.markdown('<div class="metric-success">', unsafe_allow_html=True)
+                            st.success(f"Transaction within normal range (Score: {d['anomaly_score']:.4f})")
+                            st.markdown('</div>', unsafe_allow_html=True)
+
+                        with st.expander("View Full JSON Payload"):
+                            st.json(result)
+                    else:
+                        st.markdown('<div class="metric-error">', unsafe_allow_html=True)
+                        st.error(result.get("error", "Validation failed"))
+                        st.markdown('</div>', unsafe_allow_html=True)
+
+        with col_preview:
+            with st.container(border=True):
+                st.subheader("System Flow")
+                st.markdown(
+                    """
+                    1. Entity extraction via LLM  
+                    2. Referential validation in SQL  
+                    3. Business rule enforcement  
+                    4. Anomaly scoring via ML  
+                    """
+                )
+
+            if raw_text:
+                with st.container(border=True):
+                    st.subheader("Live Preview")
+                    st.code(raw_text, language="text")
+
+@st.fragment(run_every="10s")
+def render_dashboard():
+    with st.container(border=True):
+        st.subheader("Database Transactions")
+
+        try:
+            df = fetch_transactions()
+        except requests.RequestException:
+            st.warning("Unable to fetch transactions from backend.")
+            return
+
+        if df.empty:
+            st.info("No transactions found in database.")
+            return
+
+        df["status"] = "SUCCESS"
+
+        k1, k2, k3 = st.columns(3)
+        with k1:
+            st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
+            st.metric("Total Records", len(df))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        with k2:
+            st.markdown('<div class="metric-success">', unsafe_allow_html=True)
+            st.metric("Approved", len(df))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        with k3:
+            st.markdown('<div class="metric-error">', unsafe_allow_html=True)
+            st.metric("Rejected", "0")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        st.dataframe(
+            df,
+            use_container_width=True,
+            column_config={
+                "anomaly_score": st.column_config.ProgressColumn(
+                    "Anomaly Score",
+                    min_value=-0.5,
+                    max_value=0.5,
+                    format="%.4f"
+                ),
+                "total_price": st.column_config.NumberColumn(
+                    "Total Price",
+                    format="$%.2f"
+                )
+            }
+        )
+
+        st.subheader("Anomaly Score Distribution")
+        st.vega_lite_chart(anomaly_chart_spec(df), use_container_width=True)
+
 # ---------------- MAIN APP ----------------
 def main():
     st.title("SmartFlow – Data Quality Pipeline")
@@ -77,6 +263,7 @@ def main():
         with st.container(border=True):
             st.subheader("Controls")
             if st.button("Refresh Dashboard", use_container_width=True):
+                fetch_transactions.clear()
                 st.rerun()
 
         with st.container(border=True):
@@ -87,151 +274,11 @@ def main():
 
     # ================= TAB 1 =================
     with tab1:
-        with st.container(border=True):
-            st.subheader("Transaction Input")
-
-            col_input, col_preview = st.columns([1.6, 1], gap="large")
-
-            with col_input:
-                raw_text = st.text_area(
-                    "Transaction Text",
-                    height=150,
-                    placeholder="Example: Sold 5 iPhone 15s to Client A"
-                )
-
-                if st.button("Process Transaction", use_container_width=True, type="primary"):
-                    if not raw_text.strip():
-                        st.warning("Transaction text is required.")
-                        return
-
-                    with st.spinner("AI parsing, validating, and scoring..."):
-                        res = requests.post(
-                            f"{API_URL}/process/",
-                            json={"text": raw_text},
-                            timeout=10
-                        )
-
-                        if res.status_code != 200:
-                            st.error(f"Backend Error ({res.status_code})")
-                            return
-
-                        result = res.json()
-                        status_badge(result["status"])
-
-                        if result["status"] == "SUCCESS":
-                            d = result["data"]
-
-                            c1, c2, c3 = st.columns(3)
-                            with c1:
-                                st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
-                                st.metric("Item", result["logs"]["parsed_json"]["item"])
-                                st.markdown('</div>', unsafe_allow_html=True)
-
-                            with c2:
-                                st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
-                                st.metric("Quantity", d["quantity"])
-                                st.markdown('</div>', unsafe_allow_html=True)
-
-                            with c3:
-                                st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
-                                st.metric("Total Value", f"${d['total_price']}")
-                                st.markdown('</div>', unsafe_allow_html=True)
-
-                            if d["is_flagged"]:
-                                st.markdown('<div class="metric-warning">', unsafe_allow_html=True)
-                                st.warning(f"Anomaly detected (Score: {d['anomaly_score']:.4f})")
-                                st.markdown('</div>', unsafe_allow_html=True)
-                            else:
-                                st.markdown('<div class="metric-success">', unsafe_allow_html=True)
-                                st.success(f"Transaction within normal range (Score: {d['anomaly_score']:.4f})")
-                                st.markdown('</div>', unsafe_allow_html=True)
-
-                            with st.expander("View Full JSON Payload"):
-                                st.json(result)
-                        else:
-                            st.markdown('<div class="metric-error">', unsafe_allow_html=True)
-                            st.error(result.get("error", "Validation failed"))
-                            st.markdown('</div>', unsafe_allow_html=True)
-
-            with col_preview:
-                with st.container(border=True):
-                    st.subheader("System Flow")
-                    st.markdown(
-                        """
-                        1. Entity extraction via LLM  
-                        2. Referential validation in SQL  
-                        3. Business rule enforcement  
-                        4. Anomaly scoring via ML  
-                        """
-                    )
-
-                if raw_text:
-                    with st.container(border=True):
-                        st.subheader("Live Preview")
-                        st.code(raw_text, language="text")
+        render_data_entry()
 
     # ================= TAB 2 =================
     with tab2:
-        with st.container(border=True):
-            st.subheader("Database Transactions")
-
-            res = requests.get(f"{API_URL}/transactions/", timeout=5)
-            if res.status_code != 200:
-                st.warning("Unable to fetch transactions from backend.")
-                return
-
-            data = res.json()
-            if not data:
-                st.info("No transactions found in database.")
-                return
-
-            df = pd.DataFrame(data)
-            df["status"] = "SUCCESS"
-
-            k1, k2, k3 = st.columns(3)
-            with k1:
-                st.markdown('<div class="metric-neutral">', unsafe_allow_html=True)
-                st.metric("Total Records", len(df))
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            with k2:
-                st.markdown('<div class="metric-success">', unsafe_allow_html=True)
-                st.metric("Approved", len(df))
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            with k3:
-                st.markdown('<div class="metric-error">', unsafe_allow_html=True)
-                st.metric("Rejected", "0")
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            st.dataframe(
-                df,
-                use_container_width=True,
-                column_config={
-                    "anomaly_score": st.column_config.ProgressColumn(
-                        "Anomaly Score",
-                        min_value=-0.5,
-                        max_value=0.5,
-                        format="%.4f"
-                    ),
-                    "total_price": st.column_config.NumberColumn(
-                        "Total Price",
-                        format="$%.2f"
-                    )
-                }
-            )
-
-            st.subheader("Anomaly Score Distribution")
-            chart = (
-                alt.Chart(df)
-                .mark_bar(color="#22c55e")
-                .encode(
-                    x=alt.X("anomaly_score:Q", bin=alt.Bin(maxbins=20)),
-                    y=alt.Y("count()")
-                )
-                .properties(height=320)
-            )
-            st.altair_chart(chart, use_container_width=True)
+        render_dashboard()
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,278 @@
 # database.py
+import asyncio
+import logging
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import lru_cache
 import pyodbc
 from dotenv import load_dotenv
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
+# Let the ODBC driver manager keep physical connections warm as well
+pyodbc.pooling = True
+
+# Max idle connections kept per connection string
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# One pool per connection string, shared by every DatabaseHandler instance
+_pools: Dict[str, "queue.LifoQueue[pyodbc.Connection]"] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(connection_string: str) -> "queue.LifoQueue[pyodbc.Connection]":
+    with _pools_lock:
+        pool = _pools.get(connection_string)
+        if pool is None:
+            pool = queue.LifoQueue(maxsize=POOL_SIZE)
+            _pools[connection_string] = pool
+        return pool
+
+
+# Write batching: rows arriving within WRITE_BATCH_WAIT_S share one commit
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_WAIT_S = 0.05
+# How long insert_transaction waits for its batch to be flushed
+WRITE_TIMEOUT_S = float(os.getenv("DB_WRITE_TIMEOUT", "5"))
+
+_writers: Dict[str, "TransactionWriter"] = {}
+_writers_lock = threading.Lock()
+
+INSERT_TRANSACTION_QUERY = """
+INSERT INTO fact_sales_transactions
+(client_id, item_id, quantity, total_price, anomaly_score, is_flagged, data_source)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Seconds a cached dimension snapshot stays fresh
+DIM_CACHE_TTL = float(os.getenv("DIM_CACHE_TTL", "60"))
+
+# Seconds the dashboard's recent-transactions list is reused
+RECENT_CACHE_TTL = float(os.getenv("RECENT_CACHE_TTL", "5"))
+
+# Recently seen request hashes, checked before hitting SQL
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+_seen_hashes: "OrderedDict[str, None]" = OrderedDict()
+_seen_lock = threading.Lock()
+
+# In-process read cache: key -> (loaded_at, version, value).
+# Bumping a key's version invalidates it, even if a reload is in flight.
+_cache: Dict[str, Tuple[float, int, Any]] = {}
+_cache_versions: Dict[str, int] = {}
+_cache_lock = threading.Lock()
+
+
+def close_pool():
+    """Closes every idle pooled connection (called on application shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _remember_hash(request_hash: str):
+    """Adds a hash to the in-process LRU of known duplicates."""
+    with _seen_lock:
+        _seen_hashes[request_hash] = None
+        _seen_hashes.move_to_end(request_hash)
+        if len(_seen_hashes) > IDEMPOTENCY_CACHE_SIZE:
+            _seen_hashes.popitem(last=False)
+
+
+def invalidate_cache(*keys: str):
+    """Marks the given cached reads (all of them if none given) as stale."""
+    with _cache_lock:
+        for key in keys or list(_cache):
+            _cache_versions[key] = _cache_versions.get(key, 0) + 1
+
+
+def _cached(key: str, ttl: float, loader: Callable[[], Any]) -> Any:
+    """Returns the cached value for key, reloading it when expired or invalidated."""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        version = _cache_versions.get(key, 0)
+    if entry and entry[1] == version and now - entry[0] <= ttl:
+        return entry[2]
+
+    # Loader errors propagate and nothing is cached
+    value = loader()
+    with _cache_lock:
+        _cache[key] = (now, version, value)
+    return value
+
+
+class PooledConnection:
+    """
+    Context manager that borrows a connection from the pool and hands it
+    back on exit. Uncommitted work is rolled back before the connection
+    is returned, and broken connections are discarded instead of reused.
+    """
+    def __init__(self, connection_string: str):
+        self.connection_string = connection_string
+        self.pool = _get_pool(connection_string)
+        self.conn = None
+
+    def __enter__(self) -> pyodbc.Connection:
+        try:
+            self.conn = self.pool.get_nowait()
+        except queue.Empty:
+            try:
+                self.conn = pyodbc.connect(self.connection_string, autocommit=False)
+            except pyodbc.Error as e:
+                logger.error("Error connecting to SQL Server: %s", e)
+                raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        conn, self.conn = self.conn, None
+        try:
+            # Leave nothing open for the next borrower
+            conn.rollback()
+        except pyodbc.Error:
+            # Connection is dead; drop it and let the pool reconnect lazily
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return False
+
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return False
+
+
+def _write_transactions(connection_string: str, rows: Sequence[tuple]) -> List[bool]:
+    """
+    Inserts fact rows in a single transaction (one executemany, one commit).
+    If the batch fails, rows are retried one by one so a single bad row
+    does not sink the others. Returns a success flag per row.
+    """
+    with PooledConnection(connection_string) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.fast_executemany = True
+            cursor.executemany(INSERT_TRANSACTION_QUERY, rows)
+            conn.commit()
+            results = [True] * len(rows)
+        except Exception as e:
+            conn.rollback()
+            if len(rows) == 1:
+                logger.error("[DB] Insert Failed: %s", e)
+                return [False]
+
+            results = []
+            for row in rows:
+                try:
+                    cursor.execute(INSERT_TRANSACTION_QUERY, row)
+                    conn.commit()
+                    results.append(True)
+                except Exception as row_error:
+                    logger.error("[DB] Insert Failed: %s", row_error)
+                    conn.rollback()
+                    results.append(False)
+
+    if any(results):
+        # Only the dashboard list changes; the dimension maps stay valid
+        invalidate_cache("recent_transactions")
+        logger.info("[DB] %d transaction(s) saved successfully.", sum(results))
+    return results
+
+
+class TransactionWriter:
+    """
+    Background flusher for fact-table inserts.
+    Callers queue a row and wait on a Future; a daemon thread drains up
+    to WRITE_BATCH_SIZE rows (or whatever arrives within
+    WRITE_BATCH_WAIT_S) and writes them with _write_transactions.
+    """
+    def __init__(self, connection_string: str):
+        self.connection_string = connection_string
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: tuple) -> Future:
+        future: Future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_BATCH_WAIT_S
+            while len(batch) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Rows whose caller gave up (cancelled on timeout) are never written
+            batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = _write_transactions(self.connection_string, [row for row, _ in batch])
+            except Exception as e:
+                # Could not even get a connection
+                logger.error("[DB] Insert Failed: %s", e)
+                results = [False] * len(batch)
+
+            for (_, future), ok in zip(batch, results):
+                future.set_result(ok)
+
+
+def _get_writer(connection_string: str) -> TransactionWriter:
+    with _writers_lock:
+        writer = _writers.get(connection_string)
+        if writer is None:
+            writer = TransactionWriter(connection_string)
+            _writers[connection_string] = writer
+        return writer
+
 
 class DatabaseHandler:
     """
     Handles connections and raw queries to Microsoft SQL Server.
     """
+    RECENT_TRANSACTIONS_QUERY = """
+    SELECT TOP 10
+        t.transaction_id,
+        i.item_name,
+        c.client_name,
+        t.quantity,
+        t.total_price,
+        t.anomaly_score,
+        t.transaction_date
+    FROM fact_sales_transactions t
+    JOIN dim_items i ON t.item_id = i.item_id
+    JOIN dim_clients c ON t.client_id = c.client_id
+    ORDER BY t.transaction_date DESC
+    """
+
     def __init__(self):
         self.server = os.getenv("DB_SERVER", "localhost")
         self.database = os.getenv("DB_NAME", "SmartFlowDB")
@@ -27,13 +287,14 @@ class DatabaseHandler:
             f"TrustServerCertificate=yes;"
         )
 
-    def get_connection(self) -> pyodbc.Connection:
-        """Establishes and returns a database connection."""
-        try:
-            return pyodbc.connect(self.connection_string)
-        except pyodbc.Error as e:
-            print(f"Error connecting to SQL Server: {e}")
-            raise
+    def get_connection(self) -> PooledConnection:
+        """
+        Returns a pooled connection, to be used as a context manager:
+
+            with db.get_connection() as conn:
+                ...
+        """
+        return PooledConnection(self.connection_string)
 
     def fetch_valid_entities(self, table_name: str, column_name: str) -> List[str]:
         """
@@ -42,132 +303,188 @@ class DatabaseHandler:
         query = f"SELECT {column_name} FROM {table_name}"
 
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return [row[0] for row in rows]
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                return [row[0] for row in rows]
         except Exception as e:
-            print(f"Error fetching entities from {table_name}: {e}")
+            logger.error("Error fetching entities from %s: %s", table_name, e)
             return []
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
-    def insert_transaction(self, data: dict) -> bool:
+    # Stock is deliberately not cached: it changes on every order, and
+    # caching it would force these stable maps to reload under write load.
+    def get_item_ids(self) -> Dict[str, int]:
         """
-        Commits the validated transaction to the Fact Table.
+        Returns {item_name: item_id} for every item.
+        Served from an in-process cache refreshed every DIM_CACHE_TTL seconds.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        return _cached("item_ids", DIM_CACHE_TTL, self._load_item_ids)
 
-        query = """
-        INSERT INTO fact_sales_transactions
-        (client_id, item_id, quantity, total_price, anomaly_score, is_flagged, data_source)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+    def get_item_prices(self) -> Dict[int, float]:
+        """Returns {item_id: unit_price}, cached like get_item_ids()."""
+        return _cached("item_prices", DIM_CACHE_TTL, self._load_item_prices)
+
+    def get_client_ids(self) -> Dict[str, int]:
+        """Returns {client_name: client_id}, cached like get_item_ids()."""
+        return _cached("client_ids", DIM_CACHE_TTL, self._load_client_ids)
+
+    def get_item_stock(self, item_id: int) -> Optional[Tuple[int, float]]:
+        """Point lookup of (current_stock, unit_price), always read from SQL."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT current_stock, unit_price FROM dim_items WHERE item_id = ?", (item_id,))
+            row = cursor.fetchone()
+        return (int(row[0]), float(row[1])) if row else None
+
+    def _load_item_ids(self) -> Dict[str, int]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT item_name, item_id FROM dim_items")
+            rows = cursor.fetchall()
+        return {row[0]: int(row[1]) for row in rows}
+
+    def _load_item_prices(self) -> Dict[int, float]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT item_id, unit_price FROM dim_items")
+            rows = cursor.fetchall()
+        return {int(row[0]): float(row[1]) for row in rows}
+
+    def _load_client_ids(self) -> Dict[str, int]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT client_name, client_id FROM dim_clients")
+            rows = cursor.fetchall()
+        return {row[0]: int(row[1]) for row in rows}
+
+    def insert_transaction(self, data: dict, batched: bool = True) -> bool:
+        """
+        Commits the validated transaction to the Fact Table.
+
+        By default the row is handed to the background TransactionWriter
+        and shares a commit with concurrent inserts; this call still
+        blocks until its batch is committed. Pass batched=False to write
+        synchronously on the calling thread.
         """
+        row = (
+            data["client_id"],
+            data["item_id"],
+            data["quantity"],
+            data["total_price"],
+            data["anomaly_score"],
+            1 if data["is_flagged"] else 0,
+            "API_V1"
+        )
 
         try:
-            cursor.execute(query, (
-                data["client_id"],
-                data["item_id"],
-                data["quantity"],
-                data["total_price"],
-                data["anomaly_score"],
-                1 if data["is_flagged"] else 0,
-                "API_V1"
-            ))
-            conn.commit()
-            print("[DB] Transaction saved successfully.")
-            return True
+            if not batched:
+                return _write_transactions(self.connection_string, [row])[0]
+
+            future = _get_writer(self.connection_string).submit(row)
+            try:
+                return future.result(timeout=WRITE_TIMEOUT_S)
+            except FutureTimeout:
+                if future.cancel():
+                    logger.error("[DB] Insert Failed: timed out waiting for the batch commit.")
+                    return False
+                # Already being written: report what actually happened
+                return future.result()
         except Exception as e:
-            print(f"[DB] Insert Failed: {e}")
-            conn.rollback()
+            logger.error("[DB] Insert Failed: %s", e)
             return False
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
     def fetch_recent_transactions(self):
         """
         Fetches the last 10 transactions for the dashboard.
         """
-        conn = self.get_connection()
-        query = """
-        SELECT TOP 10
-            t.transaction_id,
-            i.item_name,
-            c.client_name,
-            t.quantity,
-            t.total_price,
-            t.anomaly_score,
-            t.transaction_date
-        FROM fact_sales_transactions t
-        JOIN dim_items i ON t.item_id = i.item_id
-        JOIN dim_clients c ON t.client_id = c.client_id
-        ORDER BY t.transaction_date DESC
-        """
-
         try:
-            return pd.read_sql(query, conn)
+            # Plain cursor + from_records skips pd.read_sql's DBAPI/SQLAlchemy path
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self.RECENT_TRANSACTIONS_QUERY)
+                columns = [col[0] for col in cursor.description]
+                rows = cursor.fetchall()
+            return pd.DataFrame.from_records(rows, columns=columns)
         except Exception as e:
-            print(f"Error fetching data: {e}")
+            logger.error("Error fetching data: %s", e)
             return None
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+
+    def get_recent_transactions(self) -> List[Dict[str, Any]]:
+        """
+        Returns the last 10 transactions as dicts. The list is reused for
+        RECENT_CACHE_TTL seconds, or until the next insert invalidates it.
+        """
+        try:
+            return _cached("recent_transactions", RECENT_CACHE_TTL,
+                           lambda: list(self._iter_recent_rows()))
+        except Exception as e:
+            logger.error("Error fetching data: %s", e)
+            return []
+
+    def _iter_recent_rows(self, batch_size: int = 200) -> Iterator[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.RECENT_TRANSACTIONS_QUERY)
+            columns = [col[0] for col in cursor.description]
+            while rows := cursor.fetchmany(batch_size):
+                yield from (dict(zip(columns, row)) for row in rows)
 
     def check_idempotency(self, request_hash: str) -> bool:
         """
         Returns True if the hash ALREADY exists (Duplicate).
         Returns False if it is new (Safe to proceed).
+        Known hashes are answered from memory without a SQL round-trip.
+        """
+        with _seen_lock:
+            if request_hash in _seen_hashes:
+                _seen_hashes.move_to_end(request_hash)
+                return True
+
+        # Existence probe; stops at the first matching row
+        query = """
+        SELECT TOP 1 1
+        FROM transaction_idempotency_log
+        WHERE request_hash = ?
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
         try:
-            query = """
-            SELECT COUNT(*)
-            FROM transaction_idempotency_log
-            WHERE request_hash = ?
-            """
-            cursor.execute(query, (request_hash,))
-            count = cursor.fetchone()[0]
-            return count > 0
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (request_hash,))
+                exists = cursor.fetchone() is not None
+            if exists:
+                _remember_hash(request_hash)
+            return exists
         except Exception as e:
-            print(f"[DB] Idempotency Check Error: {e}")
+            logger.error("[DB] Idempotency Check Error: %s", e)
             return False
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+
+    async def check_idempotency_async(self, request_hash: str) -> bool:
+        """check_idempotency for the event loop (pyodbc blocks, so it runs in a worker thread)."""
+        return await asyncio.to_thread(self.check_idempotency, request_hash)
 
     def log_idempotency(self, request_hash: str):
         """
         Saves the hash to prevent future duplicates.
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        query = """
+        INSERT INTO transaction_idempotency_log (request_hash)
+        VALUES (?)
+        """
         try:
-            query = """
-            INSERT INTO transaction_idempotency_log (request_hash)
-            VALUES (?)
-            """
-            cursor.execute(query, (request_hash,))
-            conn.commit()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (request_hash,))
+                conn.commit()
+            _remember_hash(request_hash)
         except Exception as e:
-            print(f"[DB] Failed to log hash: {e}")
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+            logger.error("[DB] Failed to log hash: %s", e)
+
+
+@lru_cache(maxsize=None)
+def get_database() -> DatabaseHandler:
+    """Process-wide DatabaseHandler shared by every pipeline module."""
+    return DatabaseHandler()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,29 @@
 # integrity.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Tuple, Optional, Dict, Any
-from database import DatabaseHandler
-from normalizer import DataNormalizer
+import pyodbc
+from database import get_database
+from normalizer import get_normalizer
+
+logger = logging.getLogger(__name__)
+
+# Shared by all checkers so item and client lookups run side by side
+_LOOKUP_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="integrity")
 
 class IntegrityChecker:
     """
     Ensures that items and clients mentioned in the transaction 
     actually exist in the SQL Dimension tables.
     """
+    # Fixed statement text so SQL Server can reuse the cached plan
+    _Q_ITEM = "SELECT item_id FROM dim_items WHERE item_name = ?"
+    _Q_CLIENT = "SELECT client_id FROM dim_clients WHERE client_name = ?"
+
     def __init__(self):
-        self.db = DatabaseHandler()
-        self.normalizer = DataNormalizer()
+        self.db = get_database()
+        self.normalizer = get_normalizer()
 
     def get_valid_ids(self, raw_item: str, raw_client: str) -> Tuple[Optional[int], Optional[int], Dict[str, str]]:
         """
@@ -28,9 +41,12 @@ class IntegrityChecker:
         """
         logs = {}
         
-        # 1. Normalize Names (Text -> Canonical)
-        canon_item = self.normalizer.normalize(raw_item, "item")
-        canon_client = self.normalizer.normalize(raw_client, "client")
+        # 1+2. Normalize (Text -> Canonical) and fetch IDs (Canonical -> ID).
+        # Item and client are independent, so resolve them concurrently.
+        item_future = _LOOKUP_POOL.submit(self._resolve, raw_item, "item", "dim_items", "item_id", "item_name")
+        client_future = _LOOKUP_POOL.submit(self._resolve, raw_client, "client", "dim_clients", "client_id", "client_name")
+        canon_item, item_id = item_future.result()
+        canon_client, client_id = client_future.result()
         
         logs['normalized_item'] = canon_item
         logs['normalized_client'] = canon_client
@@ -39,29 +55,54 @@ class IntegrityChecker:
         if not canon_item or not canon_client:
             return None, None, logs
 
-        # 2. Fetch IDs from SQL (Canonical -> ID)
-        item_id = self._fetch_id("dim_items", "item_id", "item_name", canon_item)
-        client_id = self._fetch_id("dim_clients", "client_id", "client_name", canon_client)
-        
         return item_id, client_id, logs
 
+    def _resolve(self, raw_value: str, category: str, table: str, id_col: str, name_col: str) -> Tuple[Optional[str], Optional[int]]:
+        """Normalizes one name and looks up its ID. Returns (canonical_name, id)."""
+        canonical = self.normalizer.normalize(raw_value, category)
+        if not canonical:
+            return None, None
+        return canonical, self._fetch_id(table, id_col, name_col, canonical)
+
     def _fetch_id(self, table: str, id_col: str, name_col: str, value: str) -> Optional[int]:
-        """Helper query to get a single ID."""
+        """Helper to get a single ID, served from the cached dimension maps when possible."""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            query = f"SELECT {id_col} FROM {table} WHERE {name_col} = ?"
-            cursor.execute(query, (value,))
-            row = cursor.fetchone()
-            conn.close()
-            
+            if table == "dim_items":
+                item_id = self.db.get_item_ids().get(value)
+                if item_id is not None:
+                    return item_id
+            elif table == "dim_clients":
+                client_id = self.db.get_client_ids().get(value)
+                if client_id is not None:
+                    return client_id
+
+            # Cache miss (e.g. a row added since the last refresh): ask SQL directly
+            if table == "dim_items":
+                query = self._Q_ITEM
+            elif table == "dim_clients":
+                query = self._Q_CLIENT
+            else:
+                query = f"SELECT {id_col} FROM {table} WHERE {name_col} = ?"
+
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                # Pin the parameter type so pyodbc skips describing it per call
+                cursor.setinputsizes([(pyodbc.SQL_WVARCHAR, 255, 0)])
+                cursor.execute(query, (value,))
+                row = cursor.fetchone()
+
             if row:
                 return int(row[0])
             return None
         except Exception as e:
-            print(f"DB Error fetching ID: {e}")
+            logger.error("DB Error fetching ID: %s", e)
             return None
 
+@lru_cache(maxsize=None)
+def get_integrity_checker() -> IntegrityChecker:
+    """Shared IntegrityChecker instance."""
+    return IntegrityChecker()
+
 # Testing Block
 if __name__ == "__main__":
     checker = IntegrityChecker()
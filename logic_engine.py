@@ -1,18 +1,34 @@
 # logic_engine.py
+import logging
+from functools import lru_cache
 from typing import Tuple, Optional
-from database import DatabaseHandler
+from database import get_database
+
+logger = logging.getLogger(__name__)
 
 class BusinessLogicEngine:
     """
     Enforces dynamic business rules by querying the current state 
     of the database (e.g., Stock Levels, Credit Limits).
     """
+    # Check and decrement in one statement: no row comes back unless
+    # enough stock was left, so concurrent orders cannot oversell.
+    _RESERVE_STOCK = """
+    UPDATE dim_items
+    SET current_stock = current_stock - ?
+    OUTPUT inserted.unit_price
+    WHERE item_id = ? AND current_stock >= ?
+    """
+    _RELEASE_STOCK = "UPDATE dim_items SET current_stock = current_stock + ? WHERE item_id = ?"
+
     def __init__(self):
-        self.db = DatabaseHandler()
+        self.db = get_database()
 
     def check_stock_availability(self, item_id: int, requested_qty: int) -> Tuple[bool, str, float]:
         """
-        Verifies if we have enough stock to fulfill the order.
+        Verifies if we have enough stock to fulfill the order and, if so,
+        reserves it (the stock is decremented atomically).
+        Call release_stock() if the order is not persisted afterwards.
         
         Args:
             item_id: The SQL Primary Key of the item.
@@ -24,32 +40,59 @@ class BusinessLogicEngine:
             - message: Error text or "OK"
             - unit_price: The current price (needed for the Fact table later)
         """
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
         try:
-            # Fetch current stock and price for the specific item
-            query = "SELECT current_stock, unit_price FROM dim_items WHERE item_id = ?"
-            cursor.execute(query, (item_id,))
-            row = cursor.fetchone()
-            
-            if not row:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self._RESERVE_STOCK, (requested_qty, item_id, requested_qty))
+                row = cursor.fetchone()
+                conn.commit()
+
+            if row:
+                return True, "Stock Available", float(row[0])
+
+            # Nothing updated: unknown item or not enough stock.
+            # This read only words the rejection.
+            details = self.db.get_item_stock(item_id)
+            if not details:
                 return False, f"Item ID {item_id} not found in DB.", 0.0
 
-            current_stock = int(row[0])
-            unit_price = float(row[1])
+            current_stock, unit_price = details
 
             # THE RULE: Can't sell what you don't have
-            if requested_qty > current_stock:
-                msg = f"Insufficient Stock. Requested: {requested_qty}, Available: {current_stock}"
-                return False, msg, unit_price
-            
-            return True, "Stock Available", unit_price
+            msg = f"Insufficient Stock. Requested: {requested_qty}, Available: {current_stock}"
+            return False, msg, float(unit_price)
 
         except Exception as e:
             return False, f"Database Error: {e}", 0.0
-        finally:
-            conn.close()
+
+    def get_unit_price(self, item_id: int) -> Optional[float]:
+        """
+        Unit price from the cached price map, without touching stock.
+        May lag a price change by the cache TTL; the reservation in
+        check_stock_availability returns the committed price.
+        """
+        try:
+            return self.db.get_item_prices().get(item_id)
+        except Exception as e:
+            logger.warning("[Logic] Price lookup failed for item %s: %s", item_id, e)
+            return None
+
+    def release_stock(self, item_id: int, qty: int) -> bool:
+        """Gives back stock reserved by check_stock_availability (e.g. when the insert fails)."""
+        try:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self._RELEASE_STOCK, (qty, item_id))
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error("[Logic] Failed to release stock for item %s: %s", item_id, e)
+            return False
+
+@lru_cache(maxsize=None)
+def get_logic_engine() -> BusinessLogicEngine:
+    """Shared BusinessLogicEngine instance."""
+    return BusinessLogicEngine()
 
 # Testing Block
 if __name__ == "__main__":
@@ -62,6 +105,9 @@ if __name__ == "__main__":
     print("Test 1: Ordering 5 iPhones (Should PASS)")
     allowed, msg, price = logic.check_stock_availability(item_id=1, requested_qty=5)
     print(f"   -> Result: {allowed} | Message: {msg} | Price: ${price}")
+    if allowed:
+        # The check reserved the stock; put it back
+        logic.release_stock(item_id=1, qty=5)
 
     # Test 2: Invalid Order (Buy 1000)
     print("\nTest 2: Ordering 1000 iPhones (Should FAIL)")
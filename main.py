@@ -1,13 +1,45 @@
 # main.py
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, Iterator
 from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from router import TransactionRouter
+from database import close_pool, get_database
 import uvicorn
 
-# Initialize App and Logic
+def configure_logging() -> QueueListener:
+    """
+    Request threads only enqueue log records; a background listener
+    thread formats them and writes to stderr.
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# Initialize Logging, App and Logic
+log_listener = configure_logging()
 app = FastAPI(title="SmartFlow API", version="1.0")
 router = TransactionRouter()
 
+@app.on_event("shutdown")
+def release_connections():
+    """Closes pooled SQL Server connections and flushes logs when the server stops."""
+    close_pool()
+    log_listener.stop()
+
 # Define the Input Schema (What the API expects)
 class TransactionRequest(BaseModel):
     text: str
@@ -19,7 +51,7 @@ def health_check():
     return {"status": "online", "system": "SmartFlow v1.5"}
 
 @app.post("/process/")
-def process_transaction(request: TransactionRequest):
+async def process_transaction(request: TransactionRequest):
     """
     Main Endpoint.
     Receives raw text -> Runs Pipeline -> Returns result.
@@ -29,8 +61,8 @@ def process_transaction(request: TransactionRequest):
     if not raw_text:
         raise HTTPException(status_code=400, detail="Input text cannot be empty.")
 
-    # Call our Orchestrator
-    result = router.process_request(raw_text)
+    # Await the async pipeline: the LLM call doesn't tie up a worker thread
+    result = await router.process_request_async(raw_text)
 
     # Map internal status to HTTP Codes
     if result["status"] == "SUCCESS":
@@ -41,17 +73,16 @@ def process_transaction(request: TransactionRequest):
 
 # -------- NEW ROUTE ADDED BELOW --------
 
+def _ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Encodes rows as newline-delimited JSON, one object per line."""
+    for row in rows:
+        yield json.dumps(jsonable_encoder(row)) + "\n"
+
 @app.get("/transactions/")
 def get_transactions():
-    """Returns recent transactions for the dashboard."""
-    from database import DatabaseHandler
-
-    db = DatabaseHandler()
-    df = db.fetch_recent_transactions()
-
-    if df is not None:
-        return df.to_dict(orient="records")
-    return []
+    """Streams recent transactions for the dashboard as NDJSON."""
+    rows = get_database().get_recent_transactions()
+    return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
 
 # --------------------------------------
 
@@ -1,54 +1,211 @@
 # ml_engine.py
 import numpy as np
 import joblib
+import logging
 import os
-from sklearn.ensemble import IsolationForest
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, Optional, Sequence
+
+try:
+    # Optional: native tree-ensemble inference for the forest
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = "isolation_forest.pkl"
+ONNX_MODEL_PATH = "isolation_forest.onnx"
+
+# "zscore" = closed-form rule (default), "forest" = Isolation Forest
+ANOMALY_MODEL = os.getenv("ANOMALY_MODEL", "zscore").lower()
+
+# Share of training data treated as anomalous (both scorers)
+CONTAMINATION = 0.05
+
+# Maps the rule's relative z-margin onto the forest's decision_function
+# range (~±0.1), so both scorers share the dashboard's -0.5..0.5 scale
+RULE_SCORE_SCALE = 0.1
+RULE_SCORE_CLIP = 0.5
+
+
+class ScoreBatcher:
+    """
+    Dynamic request batching for model scoring.
+    Concurrent callers enqueue a feature row and block on a Future; a
+    background thread stacks whatever arrives within the wait window
+    (or up to max_batch_size rows) into one array and scores it in a
+    single call.
+    """
+    def __init__(self, score_fn: Callable[[np.ndarray], Sequence[float]],
+                 max_batch_size: int = 32, batch_wait_timeout_s: float = 0.02):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, features: Sequence[float]) -> float:
+        """Scores one feature row, batched with any concurrent callers."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="ml-batcher", daemon=True)
+                    self._thread.start()
+
+        future: Future = Future()
+        self._queue.put((features, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            # Block for the first row, then gather more until the window closes
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait_timeout_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                X = np.array([features for features, _ in batch], dtype=float)
+                scores = self.score_fn(X)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), score in zip(batch, scores):
+                future.set_result(float(score))
+
 
 class AnomalyDetector:
     """
     Uses Unsupervised Machine Learning to detect suspicious transactions.
-    Algorithm: Isolation Forest.
+    Algorithm: per-feature z-score rule fitted on the synthetic training
+    data, or Isolation Forest when ANOMALY_MODEL=forest.
     """
     def __init__(self):
         self.model = None
-        self._load_or_train_model()
+        self.onnx_session = None
+        self.use_forest = ANOMALY_MODEL == "forest"
+
+        # The rule only needs 5 numbers, so it is always fitted (cheap)
+        self._fit_rule(self._synthetic_training_data())
+
+        # The forest is loaded on first use, not at start-up
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
+        self._batcher = ScoreBatcher(self.score_batch)
+
+    def _ensure_model(self):
+        """Loads the forest once, on the first call that needs it."""
+        if self._model_loaded:
+            return
+        with self._model_lock:
+            if not self._model_loaded:
+                self._load_or_train_model()
+                self._model_loaded = True
 
     def _load_or_train_model(self):
-        """Loads existing model or trains a new one if missing."""
-        if os.path.exists(MODEL_PATH):
+        """
+        Loads existing model or trains a new one if missing.
+        Prefers the ONNX export when onnxruntime is installed.
+        """
+        if ort is not None and os.path.exists(ONNX_MODEL_PATH):
+            self.onnx_session = ort.InferenceSession(ONNX_MODEL_PATH, providers=["CPUExecutionProvider"])
+        elif os.path.exists(MODEL_PATH):
             self.model = joblib.load(MODEL_PATH)
+            # Pickles saved before n_jobs was set still score on one core
+            self.model.set_params(n_jobs=-1)
+            self._export_onnx()
         else:
-            print("[ML] Model not found. Training new model on synthetic data...")
+            logger.info("[ML] Model not found. Training new model on synthetic data...")
             self.train_model()
 
+    def _export_onnx(self):
+        """Writes the forest as ONNX and switches to onnxruntime, if both packages are installed."""
+        if ort is None:
+            return
+        try:
+            from skl2onnx import to_onnx
+        except ImportError:
+            return
+
+        try:
+            sample = self._synthetic_training_data()[:1].astype(np.float32)
+            onx = to_onnx(self.model, sample, target_opset={"": 17, "ai.onnx.ml": 3})
+            with open(ONNX_MODEL_PATH, "wb") as f:
+                f.write(onx.SerializeToString())
+            self.onnx_session = ort.InferenceSession(ONNX_MODEL_PATH, providers=["CPUExecutionProvider"])
+            logger.info("[ML] Model exported to '%s'.", ONNX_MODEL_PATH)
+        except Exception as e:
+            logger.warning("[ML] ONNX export failed (%s). Using scikit-learn.", e)
+
+    @staticmethod
+    def _synthetic_training_data() -> np.ndarray:
+        """
+        Generates 1000 synthetic 'normal' transactions.
+        Most people buy 1-5 items. Price varies.
+        """
+        rng = np.random.default_rng(42)
+        
+        # Feature 1: Quantity (Normal: 1 to 10)
+        # Feature 2: Unit Price (Normal: $100 to $2000)
+        # Both columns drawn in one call -> shape (1000, 2); high is exclusive
+        return rng.integers(low=[1, 100], high=[11, 2001], size=(1000, 2))
+
+    def _fit_rule(self, X_train: np.ndarray):
+        """
+        Precomputes the closed-form scorer:
+            score = SCALE * (threshold - max(|z_qty|, |z_price|)) / threshold
+        clipped to +-RULE_SCORE_CLIP. threshold is picked so the same
+        CONTAMINATION share of the training data scores below zero as with
+        the forest; dividing by it keeps scores on the forest's scale.
+        """
+        mean = X_train.mean(axis=0)
+        std = X_train.std(axis=0)
+        z = np.abs((X_train - mean) / std).max(axis=1)
+
+        self.q_mean, self.p_mean = float(mean[0]), float(mean[1])
+        self.q_std, self.p_std = float(std[0]), float(std[1])
+        self.threshold = float(np.quantile(z, 1 - CONTAMINATION))
+
+    def _rule_score(self, z):
+        """Relative margin to the threshold, on the forest's score scale."""
+        score = RULE_SCORE_SCALE * (self.threshold - z) / self.threshold
+        return np.clip(score, -RULE_SCORE_CLIP, RULE_SCORE_CLIP)
+
     def train_model(self):
         """
         Generates synthetic 'normal' sales data to teach the model 
         what a standard transaction looks like.
         """
         # 1. Generate 1000 'Normal' Transactions
-        # Most people buy 1-5 items. Price varies.
-        rng = np.random.RandomState(42)
-        
-        # Feature 1: Quantity (Normal: 1 to 10)
-        X_qty = rng.randint(1, 10, size=(1000, 1))
-        
-        # Feature 2: Unit Price (Normal: $100 to $2000)
-        X_price = rng.randint(100, 2000, size=(1000, 1))
-        
-        # Combine into a feature set
-        X_train = np.hstack((X_qty, X_price))
+        X_train = self._synthetic_training_data()
+
+        # scikit-learn is only imported when a forest is actually trained
+        from sklearn.ensemble import IsolationForest
 
         # 2. Train Isolation Forest
         # contamination=0.05 means we expect ~5% of data to be anomalies in the wild
-        self.model = IsolationForest(n_estimators=100, contamination=0.05, random_state=42)
+        # n_jobs=-1 lets decision_function walk the trees on all cores
+        self.model = IsolationForest(n_estimators=100, contamination=CONTAMINATION, random_state=42, n_jobs=-1)
         self.model.fit(X_train)
         
         # 3. Save to disk
         joblib.dump(self.model, MODEL_PATH)
-        print("[ML] Model trained and saved to 'isolation_forest.pkl'.")
+        logger.info("[ML] Model trained and saved to 'isolation_forest.pkl'.")
+        self._export_onnx()
 
     def check_anomaly(self, quantity: int, unit_price: float) -> float:
         """
@@ -59,16 +216,41 @@ class AnomalyDetector:
             < 0 : Anomaly (Suspicious)
             > 0 : Normal
         """
-        if not self.model:
+        if not self.use_forest:
+            # Closed-form rule: a few float ops, no batching needed
+            z_qty = abs((quantity - self.q_mean) / self.q_std)
+            z_price = abs((unit_price - self.p_mean) / self.p_std)
+            return float(self._rule_score(max(z_qty, z_price)))
+
+        self._ensure_model()
+        if self.model is None and self.onnx_session is None:
             return 1.0 # Default to normal if model fails
 
-        # Reshape input to match training shape [qty, price]
-        features = np.array([[quantity, unit_price]])
-        
-        # decision_function returns the raw score. 
-        # Negative scores are anomalies. Positive are normal.
-        score = self.model.decision_function(features)[0]
-        return float(score)
+        # Concurrent requests are stacked into one [qty, price] matrix
+        return self._batcher.submit((quantity, unit_price))
+
+    def score_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        Scores a (B, 2) matrix of [qty, price] rows in one call.
+        Negative scores are anomalies. Positive are normal.
+        """
+        if not self.use_forest:
+            z = np.abs((features - (self.q_mean, self.p_mean)) / (self.q_std, self.p_std))
+            return self._rule_score(z.max(axis=1))
+
+        self._ensure_model()
+        if self.onnx_session is not None:
+            # The ONNX graph's "scores" output is decision_function, shape (B, 1)
+            scores = self.onnx_session.run(["scores"], {"X": features.astype(np.float32)})[0]
+            return scores.ravel()
+
+        # decision_function returns the raw score.
+        return self.model.decision_function(features)
+
+@lru_cache(maxsize=None)
+def get_anomaly_detector() -> AnomalyDetector:
+    """Shared AnomalyDetector, so the model is loaded once per process."""
+    return AnomalyDetector()
 
 # Testing Block
 if __name__ == "__main__":
@@ -1,18 +1,63 @@
 # normalizer.py
 import difflib
-from typing import List, Optional
-from database import DatabaseHandler
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+from database import get_database
+
+try:
+    # C++ Levenshtein implementation; difflib stays as the pure-Python fallback
+    from rapidfuzz import fuzz, process
+    from rapidfuzz.utils import default_process
+except ImportError:
+    process = None
+
+# Minimum similarity (0-100) for a fuzzy match. Both backends compare
+# lower-cased strings with the same Indel ratio; 60 keeps "dell xps 13" and
+# "tech corp" while rejecting "Dell Inspiron", "Mac" and "Beta LLC".
+FUZZY_CUTOFF = 60
 
 class DataNormalizer:
     """
     Responsible for mapping messy user input to canonical database entities.
     """
     def __init__(self):
-        self.db = DatabaseHandler()
+        self.db = get_database()
         # Cache valid entities in memory to reduce SQL hits
         self.valid_items = self.db.fetch_valid_entities("dim_items", "item_name")
         self.valid_clients = self.db.fetch_valid_entities("dim_clients", "client_name")
 
+        # Lowercased lookup tables for the exact-match path
+        self._items_lower: Dict[str, str] = {name.lower(): name for name in self.valid_items}
+        self._clients_lower: Dict[str, str] = {name.lower(): name for name in self.valid_clients}
+
+        # difflib fallback: each lower-cased reference is indexed once as seq2,
+        # so a lookup only has to swap in the query as seq1.
+        # Matchers are stateful, hence one lock per list.
+        self._items_matchers = self._build_matchers(list(self._items_lower))
+        self._clients_matchers = self._build_matchers(list(self._clients_lower))
+        self._items_lock = threading.Lock()
+        self._clients_lock = threading.Lock()
+
+    @staticmethod
+    def _build_matchers(reference_list: List[str]) -> List[difflib.SequenceMatcher]:
+        return [difflib.SequenceMatcher(None, None, ref, autojunk=False) for ref in reference_list]
+
+    @staticmethod
+    def _closest_match(user_input: str, matchers: List[difflib.SequenceMatcher],
+                       cutoff: float = FUZZY_CUTOFF / 100) -> Optional[str]:
+        """Same scoring as difflib.get_close_matches(n=1), without re-indexing the references."""
+        best, best_score = None, cutoff
+        for matcher in matchers:
+            matcher.set_seq1(user_input)
+            # Cheap upper bounds first, as get_close_matches does
+            if (matcher.real_quick_ratio() >= best_score
+                    and matcher.quick_ratio() >= best_score):
+                score = matcher.ratio()
+                if score > best_score or (best is None and score >= best_score):
+                    best, best_score = matcher.b, score
+        return best
+
     def normalize(self, user_input: str, category: str) -> Optional[str]:
         """
         Attempts to find the closest valid match for the user input.
@@ -30,23 +75,36 @@ class DataNormalizer:
         # Select the correct reference list
         if category == 'item':
             reference_list = self.valid_items
+            lower_map = self._items_lower
+            matchers, lock = self._items_matchers, self._items_lock
         elif category == 'client':
             reference_list = self.valid_clients
+            lower_map = self._clients_lower
+            matchers, lock = self._clients_matchers, self._clients_lock
         else:
             raise ValueError("Category must be 'item' or 'client'")
 
         # 1. Exact Match Check (Case Insensitive)
-        for valid_entity in reference_list:
-            if user_input.lower().strip() == valid_entity.lower():
-                return valid_entity
+        query = user_input.lower().strip()
+        exact = lower_map.get(query)
+        if exact is not None:
+            return exact
 
-        # 2. Fuzzy Match (Cutoff=0.6 means 60% similarity required)
-        matches = difflib.get_close_matches(user_input, reference_list, n=1, cutoff=0.5)
-        
-        if matches:
-            return matches[0] # Return the best match
-        
-        return None # No close match found
+        # 2. Fuzzy Match (FUZZY_CUTOFF similarity required, case-insensitive)
+        if process is not None:
+            match = process.extractOne(user_input, reference_list, scorer=fuzz.ratio,
+                                       processor=default_process, score_cutoff=FUZZY_CUTOFF)
+            return match[0] if match else None
+
+        with lock:
+            # Best match, or None if nothing clears the cutoff
+            best = self._closest_match(query, matchers)
+        return lower_map[best] if best is not None else None
+
+@lru_cache(maxsize=None)
+def get_normalizer() -> DataNormalizer:
+    """Shared DataNormalizer, so the reference lists are fetched once per process."""
+    return DataNormalizer()
 
 # Testing block
 if __name__ == "__main__":
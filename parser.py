@@ -1,11 +1,26 @@
 # parser.py
+import asyncio
+import hashlib
+import logging
 import os
-import json
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
 import google.generativeai as genai
 from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import Dict, Any, Optional
+from tenacity import AsyncRetrying, retry, stop_after_attempt, wait_fixed
+from typing import Dict, Any, List, Optional, Tuple
 import re 
+from redis_cache import RedisCache, get_redis_cache
+
+try:
+    # Native parser; same dict/list output as the stdlib json module
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -15,101 +30,535 @@ api_key = os.getenv("GEMINI_API_KEY")
 if api_key:
     genai.configure(api_key=api_key)
 
+# Fallback to the standard stable model (usually free tier friendly)
+MODEL_NAME = 'gemini-1.5-flash'
+
+# One GenerativeModel per process, shared by every LLMParser
+_MODEL: Optional[genai.GenerativeModel] = None
+_MODEL_LOCK = threading.Lock()
+
+
+def _get_model() -> Optional[genai.GenerativeModel]:
+    """Creates the shared model on first use; None if it cannot be built."""
+    global _MODEL
+    if _MODEL is None:
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                try:
+                    _MODEL = genai.GenerativeModel(MODEL_NAME)
+                except Exception:
+                    return None
+    return _MODEL
+
+# Answer unambiguous inputs locally (mock extractor) before calling the LLM
+LOCAL_FIRST = os.getenv("LOCAL_FIRST", "false").lower() == "true"
+
+# Extraction prompt = PREFIX + escaped user text + SUFFIX.
+# Keep the prefix byte-identical across calls (no timestamps, ids or
+# per-request formatting): Gemini's server-side prefix cache only matches
+# an exact leading byte sequence.
+_INSTRUCTIONS = (
+    "You are a Data Extraction API.\n"
+    "Extract the following fields from the user input:\n"
+    "- item (string): The product name.\n"
+    "- qty (integer): The quantity.\n"
+    "- client (string): The client/customer name.\n"
+    "- action (string): The action taken (e.g., sold, returned, ordered).\n"
+    "\n"
+)
+_USER_INPUT = 'User Input: "'
+_PROMPT_PREFIX = _INSTRUCTIONS + _USER_INPUT
+_PROMPT_SUFFIX = (
+    '"\n'
+    "\n"
+    "Return ONLY raw JSON. Do not include markdown formatting or explanations.\n"
+    'Example Output: {"item": "iPhone 15", "qty": 5, "client": "Client A", "action": "sold"}\n'
+)
+# Batch prompt = _INSTRUCTIONS (same prefix bytes) + numbered inputs + this
+_BATCH_SUFFIX = (
+    "\n"
+    "Return ONLY a raw JSON array of {count} objects, one per input, in the same order.\n"
+    "Do not include markdown formatting or explanations.\n"
+    'Example Output: [{{"item": "iPhone 15", "qty": 5, "client": "Client A", "action": "sold"}}]\n'
+)
+
+# Optional ```json ... ``` fence around the model's answer
+_MD_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.DOTALL)
+
+# Mock-mode extraction: (lower-case marker, canonical name) per entity.
+# These tuples are the only list to edit; the scan regex is built from them.
+_ITEM_MARKERS = (("iphone", "iPhone 15"), ("dell", "Dell XPS"), ("macbook", "MacBook Pro"))
+_CLIENT_MARKERS = (("techcorp", "TechCorp"), ("client a", "Client A"), ("alphallc", "AlphaLLC"))
+
+_QTY_RE = re.compile(r'\b(\d+)\b')
+_ENTITY_FIELDS = {
+    **{marker: ("item", canonical) for marker, canonical in _ITEM_MARKERS},
+    **{marker: ("client", canonical) for marker, canonical in _CLIENT_MARKERS},
+}
+# One alternation over every marker, so a single C-level scan finds them all
+_ENTITY_RE = re.compile("(" + "|".join(map(re.escape, _ENTITY_FIELDS)) + ")", re.IGNORECASE)
+def _phrase_pattern(name: str) -> str:
+    """Whole-word regex for a (multi-word) name: any spacing between words, optional plural."""
+    return r"\b" + r"\s+".join(map(re.escape, name.lower().split())) + r"s?\b"
+
+# Model numbers ("iPhone 15") are not quantities
+_ITEM_MODEL_RE = re.compile(
+    "(?:" + "|".join(re.escape(marker) for marker, _ in _ITEM_MARKERS) + r")\s+\d+\b", re.IGNORECASE
+)
+# LOCAL_FIRST only trusts an item named in full ("iPhone 15", "MacBook Pros")
+# that ends the product phrase: followed by the end of the text, punctuation,
+# a connective or a generic noun. "iPhone 14", "iPhone 15 Pro Max" or
+# "Dell XPS 13" would otherwise be booked as the canonical product.
+_ITEM_END = (
+    r"(?=\s*(?:$|[^\w\s]|(?:to|for|from|at|by|and|with|in|on"
+    r"|units?|laptops?|phones?|devices?|pieces?)\b))"
+)
+_ITEM_FULL_RE = {
+    canonical: re.compile(_phrase_pattern(canonical) + _ITEM_END, re.IGNORECASE)
+    for _, canonical in _ITEM_MARKERS
+}
+# Anything but a plain sale (returns, orders, negations) goes to the LLM
+_NON_SALE_RE = re.compile(
+    r"\b(?:return|refund|order|cancel|exchang|purchas|bought|buy|not\b|never\b)|n't\b", re.IGNORECASE
+)
+
+# Tokens that must agree before a near-duplicate result can be reused
+_NUMBER_WORDS = (
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+    "eighteen", "nineteen", "twenty", "thirty", "forty", "fifty", "sixty", "seventy",
+    "eighty", "ninety", "hundred", "thousand", "million", "dozen", "score", "gross",
+    "couple", "pair", "few", "several", "half", "single", "both", "no",
+)
+_NUMBER_RE = re.compile(r"\d+|\b(?:" + "|".join(_NUMBER_WORDS) + r")s?\b", re.IGNORECASE)
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache for parsed results, keyed on text embeddings.
+
+    Unit-length embeddings live in a fixed (maxsize, dim) matrix, so a
+    lookup is one matrix-vector product. A hit needs cosine similarity
+    >= threshold, the same quantity words/digits, and the cached item and
+    client names to be present in the new text: embeddings barely move
+    between "sold 2 ..." and "sold 3 ...", or between two client names.
+    Entries expire after ttl seconds; when full, the least recently used
+    slot is replaced.
+
+    With a RedisCache backend the entries live in Redis instead (shared by
+    all workers); the similarity threshold and guards are applied the same way.
+    """
+    def __init__(self, threshold: float = 0.92, maxsize: int = 1024, ttl: float = 3600.0,
+                 embed_model: str = "models/text-embedding-004", backend: Optional[RedisCache] = None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.embed_model = embed_model
+        self.backend = backend
+
+        self._matrix: Optional[np.ndarray] = None
+        self._stored_at = np.zeros(maxsize)
+        self._last_used = np.zeros(maxsize)
+        self._numbers: List[Optional[Tuple[str, ...]]] = [None] * maxsize
+        self._results: List[Optional[Dict[str, Any]]] = [None] * maxsize
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Returns the unit-length embedding of text (network call)."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Unit-length embeddings of texts, one row each, from a single API call."""
+        result = genai.embed_content(model=self.embed_model, content=list(texts))
+        vectors = np.asarray(result["embedding"], dtype=np.float32).reshape(len(texts), -1)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def lookup(self, vector: np.ndarray, text: str) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the closest cached result, or None on a miss."""
+        if self.backend is not None:
+            hit = self.backend.semantic_search(vector)
+            if hit is None:
+                return None
+            similarity, cached_text, result = hit
+            if (similarity < self.threshold
+                    or self._number_signature(cached_text) != self._number_signature(text)
+                    or not self._mentions(text, result)):
+                return None
+            return result
+
+        now = time.monotonic()
+        with self._lock:
+            if self._size == 0:
+                return None
+
+            sims = self._matrix[:self._size] @ vector
+            sims[now - self._stored_at[:self._size] > self.ttl] = -1.0
+            idx = int(np.argmax(sims))
+            if sims[idx] < self.threshold:
+                return None
+
+            result = self._results[idx]
+            if self._numbers[idx] != self._number_signature(text) or not self._mentions(text, result):
+                return None
+
+            self._last_used[idx] = now
+            return dict(result)
+
+    def add(self, vector: np.ndarray, text: str, result: Dict[str, Any], key: Optional[str] = None):
+        """key: sha256 of text, used as the Redis entry name when a backend is set."""
+        if self.backend is not None:
+            self.backend.semantic_add(key, vector, text, result, self.ttl)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+
+            if self._size < self.maxsize:
+                idx = self._size
+                self._size += 1
+            else:
+                expired = np.flatnonzero(now - self._stored_at > self.ttl)
+                idx = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+
+            self._matrix[idx] = vector
+            self._stored_at[idx] = now
+            self._last_used[idx] = now
+            self._numbers[idx] = self._number_signature(text)
+            self._results[idx] = dict(result)
+
+    @staticmethod
+    def _number_signature(text: str) -> Tuple[str, ...]:
+        return tuple(m.lower() for m in _NUMBER_RE.findall(text))
+
+    @staticmethod
+    def _mentions(text: str, result: Dict[str, Any]) -> bool:
+        """True if the cached item and client names each appear in text as a whole phrase."""
+        for field in ("item", "client"):
+            name = str(result.get(field, "")).strip()
+            if name and re.search(_phrase_pattern(name), text, re.IGNORECASE) is None:
+                return False
+        return True
+
+
 class LLMParser:
     """
     Handles communication with the LLM to parse unstructured text into JSON.
     Includes a 'Mock Mode' fail-safe if the API is down or quota is exceeded.
     """
     def __init__(self):
-        # Fallback to the standard stable model (usually free tier friendly)
-        self.model_name = 'gemini-1.5-flash'
-        try:
-            self.model = genai.GenerativeModel(self.model_name)
-        except Exception:
-            self.model = None
+        self.model_name = MODEL_NAME
+        self.model = _get_model()
+
+        # Bit-identical re-submissions skip the LLM entirely: sha256 -> (stored_at, result)
+        self._exact_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._exact_maxsize = 1024
+        self._ttl = 3600.0
+        self._exact_lock = threading.Lock()
+
+        # Shared by all workers when REDIS_URL is set
+        self._redis = get_redis_cache()
+
+        # Embeddings need the API too; without a key every call is MOCK anyway
+        self._sem_cache = SemanticCache(backend=self._redis) if api_key else None
 
     def _clean_json_string(self, json_str: str) -> str:
         """Removes Markdown formatting if the LLM includes it."""
-        json_str = json_str.strip()
-        if json_str.startswith("```json"):
-            json_str = json_str[7:]
-        if json_str.startswith("```"):
-            json_str = json_str[3:]
-        if json_str.endswith("```"):
-            json_str = json_str[:-3]
-        return json_str.strip()
-
-    def parse_text(self, raw_text: str) -> Optional[Dict[str, Any]]:
+        return _MD_FENCE_RE.sub('', json_str).strip()
+
+    def parse_text(self, raw_text: str, cache_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Attempts to parse text via API. If it fails, returns MOCK data 
         so development can continue.
+
+        cache_key: sha256 hex digest of raw_text, if the caller already has it.
         """
-        print(f"[*] Sending to LLM ({self.model_name})...")
-        
+        return self.parse_texts([raw_text], [cache_key])[0]
+
+    def parse_texts(self, raw_texts: List[str],
+                    cache_keys: Optional[List[Optional[str]]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Parses several inputs, sending every cache miss to the LLM in ONE
+        prompt that asks for a JSON array in input order. Results line up
+        with raw_texts. If the batch call fails, each miss gets MOCK data.
+        """
+        if cache_keys is None:
+            cache_keys = [None] * len(raw_texts)
+
+        # 1. Serve what we can from the local parse and the exact cache
+        results: List[Optional[Dict[str, Any]]] = [None] * len(raw_texts)
+        pending = []  # (index, key)
+        for i, raw_text in enumerate(raw_texts):
+            local = self._local_parse(raw_text)
+            if local is not None:
+                results[i] = local
+                continue
+
+            key = cache_keys[i] or self._cache_key(raw_text)
+            cached = self._exact_get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, key))
+
+        # 1b. Semantic cache, with one embedding call for all remaining inputs
+        misses = []  # (index, key, vector)
+        lookups = self._semantic_lookup_many([raw_texts[i] for i, _ in pending])
+        for (i, key), (cached, vector) in zip(pending, lookups):
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append((i, key, vector))
+
+        if not misses:
+            return results
+
+        # 2. One API call for all misses (the single-item prompt when there is only one)
+        miss_texts = [raw_texts[i] for i, _, _ in misses]
+        logger.info("[*] Sending %d input(s) to LLM (%s)...", len(miss_texts), self.model_name)
+
+        try:
+            if len(miss_texts) == 1:
+                parsed = [self._call_api(miss_texts[0])]
+            else:
+                parsed = self._call_api_batch(miss_texts)
+        except Exception as e:
+            logger.warning("[!] API Failed (%s). Switching to MOCK MODE.", e)
+            for i, _, _ in misses:
+                results[i] = self._mock_response(raw_texts[i])[0]
+            return results
+
+        # 3. Cache and place the fresh results
+        for (i, key, vector), result in zip(misses, parsed):
+            self._store_result(key, vector, raw_texts[i], result)
+            results[i] = result
+        return results
+
+    async def parse_text_async(self, raw_text: str, cache_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Async version of parse_text: awaits the LLM instead of blocking a
+        worker thread. Same MOCK fallback on failure.
+        """
+        local = self._local_parse(raw_text)
+        if local is not None:
+            return local
+
+        # Cache reads/writes may hit Redis, so they run off the event loop
+        key = cache_key or self._cache_key(raw_text)
+        cached = await asyncio.to_thread(self._exact_get, key)
+        if cached is not None:
+            return cached
+
+        cached, vector = await asyncio.to_thread(self._semantic_lookup, raw_text)
+        if cached is not None:
+            return cached
+
+        logger.info("[*] Sending to LLM (%s, async)...", self.model_name)
+
+        try:
+            result = await self._call_api_async(raw_text)
+        except Exception as e:
+            logger.warning("[!] API Failed (%s). Switching to MOCK MODE.", e)
+            return self._mock_response(raw_text)[0]
+
+        await asyncio.to_thread(self._store_result, key, vector, raw_text, result)
+        return result
+
+    def _local_parse(self, raw_text: str) -> Optional[Dict[str, Any]]:
+        """With LOCAL_FIRST, returns the mock extraction when it is HIGH confidence."""
+        if not LOCAL_FIRST:
+            return None
+        result, confidence = self._mock_response(raw_text)
+        if confidence != "HIGH":
+            return None
+        logger.info("[*] Local parse (all fields matched); skipping LLM call.")
+        result["action"] = "sold (LOCAL)"
+        return result
+
+    @staticmethod
+    def _cache_key(raw_text: str) -> str:
+        """Same digest the router uses for idempotency, so either side can supply it."""
+        return hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
+
+    def _exact_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns a copy of the cached result for this digest, or None if absent/expired.
+        Checks this process first, then Redis (if configured).
+        """
+        with self._exact_lock:
+            entry = self._exact_cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self._ttl:
+                del self._exact_cache[key]
+                entry = None
+            if entry is not None:
+                self._exact_cache.move_to_end(key)
+
+        if entry is not None:
+            result = dict(entry[1])
+        elif self._redis is not None:
+            result = self._redis.get(key)
+            if result is None:
+                return None
+            self._exact_put_local(key, result)
+        else:
+            return None
+
+        logger.info("[*] Exact cache hit; skipping LLM call.")
+        return result
+
+    def _exact_put(self, key: str, result: Dict[str, Any]):
+        # MOCK results are never cached, so a recovered API gets used again
+        if not isinstance(result, dict):
+            return
+        self._exact_put_local(key, result)
+        if self._redis is not None:
+            self._redis.set(key, result, ttl=int(self._ttl))
+
+    def _exact_put_local(self, key: str, result: Dict[str, Any]):
+        with self._exact_lock:
+            self._exact_cache[key] = (time.monotonic(), dict(result))
+            self._exact_cache.move_to_end(key)
+            if len(self._exact_cache) > self._exact_maxsize:
+                self._exact_cache.popitem(last=False)
+
+    def _store_result(self, key: str, vector: Optional[np.ndarray], raw_text: str, result: Dict[str, Any]):
+        """Records a fresh API result in the exact and semantic caches."""
+        self._exact_put(key, result)
+        self._semantic_store(key, vector, raw_text, result)
+
+    def _semantic_lookup(self, raw_text: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Returns (cached_result, embedding); the embedding is reused to store the API result."""
+        return self._semantic_lookup_many([raw_text])[0]
+
+    def _semantic_lookup_many(self, raw_texts: List[str]) -> List[Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]]:
+        """_semantic_lookup for several texts, embedded in one API call."""
+        if self._sem_cache is None or not raw_texts:
+            return [(None, None)] * len(raw_texts)
         try:
-            return self._call_api(raw_text)
+            vectors = self._sem_cache.embed_many(raw_texts)
         except Exception as e:
-            print(f"[!] API Failed ({e}). Switching to MOCK MODE.")
-            return self._mock_response(raw_text)
+            logger.warning("[!] Embedding failed (%s). Skipping semantic cache.", e)
+            return [(None, None)] * len(raw_texts)
+
+        lookups = []
+        for raw_text, vector in zip(raw_texts, vectors):
+            cached = self._sem_cache.lookup(vector, raw_text)
+            if cached is not None:
+                logger.info("[*] Semantic cache hit; skipping LLM call.")
+            lookups.append((cached, vector))
+        return lookups
+
+    def _semantic_store(self, key: str, vector: Optional[np.ndarray], raw_text: str, result: Dict[str, Any]):
+        if self._sem_cache is not None and vector is not None and isinstance(result, dict):
+            self._sem_cache.add(vector, raw_text, result, key=key)
 
     @retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
     def _call_api(self, raw_text: str) -> Dict[str, Any]:
         """Internal method to call the API with retry logic."""
-        prompt = f"""
-        You are a Data Extraction API. 
-        Extract the following fields from the user input:
-        - item (string): The product name.
-        - qty (integer): The quantity.
-        - client (string): The client/customer name.
-        - action (string): The action taken (e.g., sold, returned, ordered).
-
-        User Input: "{raw_text}"
-
-        Return ONLY raw JSON. Do not include markdown formatting or explanations.
-        Example Output: {{"item": "iPhone 15", "qty": 5, "client": "Client A", "action": "sold"}}
-        """
-        response = self.model.generate_content(prompt)
+        response = self.model.generate_content(self._build_prompt(raw_text))
+        clean_text = self._clean_json_string(response.text)
+        return _json.loads(clean_text)
+
+    @retry(stop=stop_after_attempt(2), wait=wait_fixed(2))
+    def _call_api_batch(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """Batch version of _call_api; retries if the array is malformed or the wrong length."""
+        response = self.model.generate_content(self._build_batch_prompt(raw_texts))
         clean_text = self._clean_json_string(response.text)
-        return json.loads(clean_text)
+        parsed = _json.loads(clean_text)
+        if not isinstance(parsed, list) or len(parsed) != len(raw_texts):
+            raise ValueError(f"Expected a JSON array of {len(raw_texts)} objects")
+        return parsed
+
+    async def _call_api_async(self, raw_text: str) -> Dict[str, Any]:
+        """
+        Async twin of _call_api; AsyncRetrying waits with asyncio.sleep, so a
+        cancel lands immediately. Malformed JSON is retried, as in _call_api.
+        """
+        prompt = self._build_prompt(raw_text)
+        async for attempt in AsyncRetrying(stop=stop_after_attempt(2), wait=wait_fixed(2), reraise=True):
+            with attempt:
+                response = await self.model.generate_content_async(prompt)
+                clean_text = self._clean_json_string(response.text)
+                return _json.loads(clean_text)
+
+    def _build_prompt(self, raw_text: str) -> str:
+        """Wraps the user text in the extraction instructions."""
+        return _PROMPT_PREFIX + raw_text.replace('"', '\\"') + _PROMPT_SUFFIX
 
+    def _build_batch_prompt(self, raw_texts: List[str]) -> str:
+        """Same instructions as _build_prompt, for N numbered inputs."""
+        numbered = "".join(
+            f'{n}. "' + text.replace('"', '\\"') + '"\n' for n, text in enumerate(raw_texts, start=1)
+        )
+        return _INSTRUCTIONS + "User Inputs (extract each one separately):\n" + numbered + _BATCH_SUFFIX.format(count=len(raw_texts))
 
-    def _mock_response(self, raw_text: str) -> Dict[str, Any]:
+
+    def _mock_response(self, raw_text: str) -> Tuple[Dict[str, Any], str]:
         """
         Returns dummy data but attempts to extract the REAL quantity
         using basic Python logic (Regex).
+
+        Also returns a confidence: "HIGH" only if the text is a plain sale
+        naming exactly one known item (in full), one known client and one
+        quantity (LOCAL_FIRST trusts these without asking the LLM), else "LOW".
         """
-        raw_lower = raw_text.lower()
-        
-        # 1. Determine Item
-        item = "Unknown Item"
-        if "iphone" in raw_lower: item = "iPhone 15"
-        elif "dell" in raw_lower: item = "Dell XPS"
-        elif "macbook" in raw_lower: item = "MacBook Pro"
-        
-        # 2. Determine Client
-        client = "Unknown Client"
-        if "techcorp" in raw_lower: client = "TechCorp"
-        elif "client a" in raw_lower: client = "Client A"
-        elif "alphallc" in raw_lower: client = "AlphaLLC"
+        # 1-2. Determine Item and Client (first mention of each wins)
+        found = {}
+        ambiguous = False
+        for match in _ENTITY_RE.finditer(raw_text):
+            field, canonical = _ENTITY_FIELDS[match.group(1).lower()]
+            # Markers are substrings: "dell" in "modelling", "client a" in "client alpha"
+            start, end = match.span()
+            if raw_text[start - 1:start].isalnum() or (field == "client" and raw_text[end:end + 1].isalnum()):
+                ambiguous = True
+            if found.setdefault(field, canonical) != canonical:
+                ambiguous = True
 
         # 3. Extract Quantity using Regex (The "Smart" Part)
-        # Looks for the first number in the text
-        qty = 1 # Default
-        match = re.search(r'\b(\d+)\b', raw_text)
-        if match:
-            qty = int(match.group(1))
-
-        return {
-            "item": item,
+        # Looks for the first number in the text, skipping model numbers
+        numbers = _QTY_RE.findall(_ITEM_MODEL_RE.sub(" ", raw_text))
+        qty = int(numbers[0]) if numbers else 1 # Default
+
+        result = {
+            "item": found.get("item", "Unknown Item"),
             "qty": qty, 
-            "client": client,
+            "client": found.get("client", "Unknown Client"),
             "action": "sold (MOCK)"
         }
+        confident = (
+            not ambiguous and len(found) == 2 and len(numbers) == 1
+            and _ITEM_FULL_RE[found["item"]].search(raw_text) is not None
+            and _NON_SALE_RE.search(raw_text) is None
+        )
+        return result, "HIGH" if confident else "LOW"
 
 
 # Testing Block
 if __name__ == "__main__":
+    # Semantic-cache guards: near-identical embeddings must not reuse a different order
+    for a, b in [("Sold thirty Dell XPS to TechCorp", "Sold forty Dell XPS to TechCorp"),
+                 ("Sold fifteen iPhone 15 to Client A", "Sold sixteen iPhone 15 to Client A"),
+                 ("Sold a couple Dell XPS to TechCorp", "Sold a few Dell XPS to TechCorp")]:
+        same = SemanticCache._number_signature(a) == SemanticCache._number_signature(b)
+        print(f"Quantity guard '{a}' vs '{b}': {'FAIL' if same else 'PASS'}")
+    cached = {"item": "iPhone 15", "qty": 2, "client": "Client A", "action": "sold"}
+    for text, expected in [("Sold 2 iPhone 15 to Client A", True),
+                           ("Sold 2 iPhone 15 to Client B as a gift", False)]:
+        ok = SemanticCache._mentions(text, cached) == expected
+        print(f"Name guard '{text}': {'PASS' if ok else 'FAIL'}")
+
     parser = LLMParser()
+
+    # LOCAL_FIRST: model variants are not the canonical product
+    for text, expected in [("Sold 3 iPhone 15 to Client A", "HIGH"),
+                           ("Sold 3 Dell XPS laptops to TechCorp.", "HIGH"),
+                           ("Sold 3 iPhone 15 Pro to Client A", "LOW"),
+                           ("Sold 3 iPhone 15 Pro Max to Client A", "LOW"),
+                           ("Sold 3 Dell XPS 13 to TechCorp", "LOW")]:
+        _, confidence = parser._mock_response(text)
+        print(f"Confidence '{text}': {confidence} [{'PASS' if confidence == expected else 'FAIL'}]")
     
     # Test Case
     sample_text = "We just shipped two Dell XPS laptops to TechCorp."
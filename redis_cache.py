@@ -0,0 +1,171 @@
+# redis_cache.py
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    # Optional: only needed when REDIS_URL is set
+    import redis
+    from redis.exceptions import ResponseError
+except ImportError:
+    redis = None
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Unset = every worker keeps its own in-process caches (the default)
+REDIS_URL = os.getenv("REDIS_URL")
+
+EXACT_PREFIX = "parser:exact:"
+SEMANTIC_PREFIX = "parser:sem:"
+SEMANTIC_INDEX = "parser:semantic"
+IDEMPOTENCY_PREFIX = "idem:"
+
+EXACT_TTL = 3600
+IDEMPOTENCY_TTL = 86400
+
+
+class RedisCache:
+    """
+    Shared cache for all API workers:
+    - exact parser cache:    parser:exact:<sha256>  (SETEX, JSON blob)
+    - semantic parser cache: parser:sem:<sha256> hashes, searched through a
+      RediSearch HNSW index (COSINE) over the embedding field
+    - idempotency claims:    idem:<sha256>  (SET NX EX, atomic across workers)
+
+    Every method swallows Redis errors and returns the "miss" answer, so an
+    unreachable Redis degrades to the per-process caches and SQL checks.
+    """
+    def __init__(self, url: str):
+        # Raw bytes in and out: embeddings are stored as FLOAT32 blobs
+        self.client = redis.Redis.from_url(url, decode_responses=False)
+        self._index_dim: Optional[int] = None
+
+    # --- Exact cache ---
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            blob = self.client.get(EXACT_PREFIX + key)
+            return _json.loads(blob) if blob is not None else None
+        except Exception as e:
+            # Unreachable Redis or a corrupt entry: treat as a miss
+            logger.warning("[Redis] GET failed: %s", e)
+            return None
+
+    def set(self, key: str, result: Dict[str, Any], ttl: int = EXACT_TTL):
+        try:
+            self.client.setex(EXACT_PREFIX + key, ttl, _dumps(result))
+        except Exception as e:
+            logger.warning("[Redis] SETEX failed: %s", e)
+
+    # --- Semantic cache ---
+    def semantic_search(self, vector: np.ndarray) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        """Returns (cosine_similarity, original_text, result) of the nearest stored entry, or None."""
+        try:
+            self._ensure_index(vector.shape[0])
+            reply = self.client.execute_command(
+                "FT.SEARCH", SEMANTIC_INDEX,
+                "*=>[KNN 1 @embedding $vec AS dist]",
+                "PARAMS", "2", "vec", vector.astype(np.float32).tobytes(),
+                "SORTBY", "dist",
+                "RETURN", "3", "dist", "text", "result",
+                "DIALECT", "2",
+            )
+            # [total, key, [field, value, ...]]
+            if not reply or reply[0] == 0:
+                return None
+            fields = dict(zip(reply[2][::2], reply[2][1::2]))
+            similarity = 1.0 - float(fields[b"dist"])
+            return similarity, fields[b"text"].decode("utf-8"), _json.loads(fields[b"result"])
+        except Exception as e:
+            # Unreachable Redis or a corrupt entry: treat as a miss
+            logger.warning("[Redis] FT.SEARCH failed: %s", e)
+            return None
+
+    def semantic_add(self, key: str, vector: np.ndarray, text: str, result: Dict[str, Any], ttl: int):
+        name = SEMANTIC_PREFIX + key
+        try:
+            self._ensure_index(vector.shape[0])
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(name, mapping={
+                "embedding": vector.astype(np.float32).tobytes(),
+                "text": text,
+                "result": _dumps(result),
+            })
+            pipe.expire(name, int(ttl))
+            pipe.execute()
+        except Exception as e:
+            logger.warning("[Redis] semantic store failed: %s", e)
+
+    def _ensure_index(self, dim: int):
+        """Creates the HNSW index on first use; the dimension comes from the embedding model."""
+        if self._index_dim == dim:
+            return
+        try:
+            self.client.execute_command(
+                "FT.CREATE", SEMANTIC_INDEX, "ON", "HASH",
+                "PREFIX", "1", SEMANTIC_PREFIX,
+                "SCHEMA", "embedding", "VECTOR", "HNSW", "6",
+                "TYPE", "FLOAT32", "DIM", str(dim), "DISTANCE_METRIC", "COSINE",
+            )
+        except ResponseError as e:
+            if "already exists" not in str(e).lower():
+                raise
+        self._index_dim = dim
+
+    # --- Idempotency ---
+    def claim(self, request_hash: str) -> Optional[bool]:
+        """
+        Atomically marks the hash as in use.
+        Returns True if this caller claimed it, False if it was already
+        claimed (duplicate), None if Redis could not answer.
+        """
+        try:
+            return bool(self.client.set(IDEMPOTENCY_PREFIX + request_hash, 1, nx=True, ex=IDEMPOTENCY_TTL))
+        except Exception as e:
+            logger.warning("[Redis] idempotency claim failed: %s", e)
+            return None
+
+    def release(self, request_hash: str):
+        """Drops a claim whose request did not commit, so it can be retried."""
+        try:
+            self.client.delete(IDEMPOTENCY_PREFIX + request_hash)
+        except Exception as e:
+            logger.warning("[Redis] idempotency release failed: %s", e)
+
+
+def _dumps(obj: Any) -> bytes:
+    data = _json.dumps(obj)
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+@lru_cache(maxsize=None)
+def get_redis_cache() -> Optional[RedisCache]:
+    """Process-wide RedisCache, or None when REDIS_URL is unset or redis-py is missing."""
+    if not REDIS_URL:
+        return None
+    if redis is None:
+        logger.warning("[Redis] REDIS_URL is set but redis-py is not installed; using local caches.")
+        return None
+    return RedisCache(REDIS_URL)
+
+
+if __name__ == "__main__":
+    cache = get_redis_cache()
+    if cache is None:
+        print("Redis disabled (set REDIS_URL and install redis).")
+    else:
+        print(f"Claim 1: {cache.claim('selftest')}")
+        print(f"Claim 2 (should be False): {cache.claim('selftest')}")
+        cache.release("selftest")
+        cache.set("selftest", {"item": "Dell XPS", "qty": 2})
+        print(f"Exact cache: {cache.get('selftest')}")
@@ -1,47 +1,182 @@
 # router.py
+import asyncio
+import codecs
 import hashlib
 import json
-from typing import Dict, Any
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
 # Import our worker modules
 from parser import LLMParser
 from validator import DataValidator
-from integrity import IntegrityChecker
-from logic_engine import BusinessLogicEngine
-from ml_engine import AnomalyDetector
-from database import DatabaseHandler
+from integrity import get_integrity_checker
+from logic_engine import get_logic_engine
+from ml_engine import get_anomaly_detector
+from database import get_database
+from redis_cache import get_redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Inputs longer than this are hashed without materialising the full UTF-8 copy
+_HASH_ONE_SHOT_MAX = 8 * 1024
+_HASH_CHUNK = 64 * 1024
+
+# Runs the anomaly score alongside the stock reservation
+_CHECK_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="router")
+
+
+def _sha256_utf8(s: str) -> str:
+    """sha256(s.encode("utf-8")).hexdigest(), encoding long strings chunk by chunk."""
+    if len(s) < _HASH_ONE_SHOT_MAX:
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    h = hashlib.sha256()
+    encoder = codecs.getincrementalencoder("utf-8")()
+    for i in range(0, len(s), _HASH_CHUNK):
+        h.update(encoder.encode(s[i:i + _HASH_CHUNK]))
+    h.update(encoder.encode("", final=True))
+    return h.hexdigest()
 
 
 class TransactionRouter:
     def __init__(self):
-        print("[Router] Initializing modules...")
+        logger.info("[Router] Initializing modules...")
         self.parser = LLMParser()
         self.validator = DataValidator()
-        self.integrity = IntegrityChecker()
-        self.logic = BusinessLogicEngine()
-        self.ml = AnomalyDetector()
-        self.db = DatabaseHandler()
-
-    def process_request(self, raw_text: str) -> Dict[str, Any]:
-        response = {
+        # Heavy modules are process-wide singletons
+        self.integrity = get_integrity_checker()
+        self.logic = get_logic_engine()
+        self.ml = get_anomaly_detector()
+        self.db = get_database()
+        # Optional cross-worker idempotency claims (REDIS_URL)
+        self.redis = get_redis_cache()
+
+    def _new_response(self) -> Dict[str, Any]:
+        return {
             "status": "REJECTED",
             "error": None,
             "data": None,
             "logs": {}
         }
 
-        # --- [NEW] STEP 0: IDEMPOTENCY CHECK ---
-        request_hash = hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
-
-        if self.db.check_idempotency(request_hash):
+    def process_request(self, raw_text: str) -> Dict[str, Any]:
+        """
+        Sync entry point for CLI/scripts: a batch of one, parsed with the
+        blocking client. Async callers (FastAPI) await process_request_async;
+        a fresh event loop per call would strand the shared model's async
+        gRPC channel on a closed loop.
+        """
+        return self.process_requests([raw_text])[0]
+
+    def process_requests(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Batch version of process_request: duplicates are filtered first, the
+        survivors are parsed with a single LLM call, then each goes through
+        steps 2-6. Responses line up with raw_texts.
+        """
+        responses = [self._new_response() for _ in raw_texts]
+        request_hashes = [_sha256_utf8(t) for t in raw_texts]
+
+        # STEP 0: IDEMPOTENCY CHECK (including repeats inside this batch)
+        survivors = []
+        seen = set()
+        for i, request_hash in enumerate(request_hashes):
+            responses[i]["logs"]["request_hash"] = request_hash
+            if request_hash in seen or self._is_duplicate(request_hash):
+                responses[i]["error"] = "Duplicate Transaction Detected (Idempotency Guard)."
+                continue
+            seen.add(request_hash)
+            survivors.append(i)
+
+        try:
+            # 1. Parse all survivors together
+            parsed = self.parser.parse_texts(
+                [raw_texts[i] for i in survivors],
+                [request_hashes[i] for i in survivors],
+            )
+            for i, parsed_data in zip(survivors, parsed):
+                self._process_parsed(parsed_data, request_hashes[i], responses[i])
+        finally:
+            for i in survivors:
+                self._release_claim(request_hashes[i], responses[i])
+        return responses
+
+    async def process_request_async(self, raw_text: str) -> Dict[str, Any]:
+        """
+        The full pipeline. The idempotency lookup, the LLM parse and the
+        dimension-cache warm-up all start together; the parse is cancelled
+        if the request turns out to be a duplicate. Blocking DB/ML steps run
+        in worker threads.
+        """
+        response = self._new_response()
+        request_hash = _sha256_utf8(raw_text)
+        response["logs"]["request_hash"] = request_hash
+
+        # STEP 0 + 1: IDEMPOTENCY CHECK overlapped with Parse
+        idem_task = asyncio.create_task(self._is_duplicate_async(request_hash))
+        parse_task = asyncio.create_task(self.parser.parse_text_async(raw_text, cache_key=request_hash))
+        prefetch_task = asyncio.create_task(asyncio.to_thread(self._prefetch_dimensions))
+
+        try:
+            is_duplicate = await idem_task
+        except BaseException:
+            parse_task.cancel()
+            raise
+
+        if is_duplicate:
+            parse_task.cancel()
             response["error"] = "Duplicate Transaction Detected (Idempotency Guard)."
             return response
 
-        # --- EXISTING PIPELINE STARTS HERE ---
-
-        # 1. Parse
-        parsed_data = self.parser.parse_text(raw_text)
-        if not parsed_data:
+        try:
+            parsed_data = await parse_task
+            await prefetch_task
+            return await asyncio.to_thread(self._process_parsed, parsed_data, request_hash, response)
+        finally:
+            # Redis DEL; keep it off the event loop like the other blocking calls
+            await asyncio.to_thread(self._release_claim, request_hash, response)
+
+    def _is_duplicate(self, request_hash: str) -> bool:
+        """
+        Redis claim first (atomic, so two workers can't both accept the same
+        text), then the SQL log, which also covers hashes older than the
+        claim TTL or a Redis outage.
+        """
+        if self.redis is not None and self.redis.claim(request_hash) is False:
+            return True
+        return self.db.check_idempotency(request_hash)
+
+    async def _is_duplicate_async(self, request_hash: str) -> bool:
+        if self.redis is not None and await asyncio.to_thread(self.redis.claim, request_hash) is False:
+            return True
+        return await self.db.check_idempotency_async(request_hash)
+
+    def _release_claim(self, request_hash: str, response: Dict[str, Any]):
+        """Only committed requests keep their claim; rejected ones may be resubmitted."""
+        if self.redis is not None and response["status"] != "SUCCESS":
+            self.redis.release(request_hash)
+
+    def _prefetch_dimensions(self):
+        """Loads dim_items/dim_clients into the shared cache; failures surface later."""
+        try:
+            self.db.get_item_ids()
+            self.db.get_client_ids()
+            self.db.get_item_prices()
+        except Exception:
+            pass
+
+    def _score_anomaly(self, item_id: int, qty: int) -> Tuple[Optional[float], Optional[float]]:
+        """Returns (price_used, anomaly_score), or (None, None) if the price is unknown."""
+        unit_price = self.logic.get_unit_price(item_id)
+        if unit_price is None:
+            return None, None
+        return unit_price, self.ml.check_anomaly(qty, unit_price)
+
+    def _process_parsed(self, parsed_data: Optional[Dict[str, Any]], request_hash: str,
+                        response: Dict[str, Any]) -> Dict[str, Any]:
+        """Steps 2-6: validate, resolve, check rules, score and persist one parsed order."""
+        if not isinstance(parsed_data, dict) or not parsed_data:
             response["error"] = "LLM failed to parse input."
             return response
         response["logs"]["parsed_json"] = parsed_data
@@ -62,29 +197,40 @@ class TransactionRouter:
             response["error"] = f"Unknown Entity. Item_ID: {item_id}, Client_ID: {client_id}"
             return response
 
-        # 4. Business Logic
+        # 4 + 5. Business Logic (DB) and ML Anomaly (CPU) in parallel;
+        # the score uses the cached price until the reservation confirms it
         qty = parsed_data["qty"]
+        anomaly_future = _CHECK_POOL.submit(self._score_anomaly, item_id, qty)
         is_allowed, logic_msg, unit_price = self.logic.check_stock_availability(item_id, qty)
         if not is_allowed:
             response["error"] = f"Business Rule Violation: {logic_msg}"
             return response
 
-        # 5. ML Anomaly
-        anomaly_score = self.ml.check_anomaly(qty, unit_price)
-        is_flagged = anomaly_score < 0
-        response["logs"]["ml_score"] = anomaly_score
-
-        # 6. Persistence (Save to DB)
-        final_payload = {
-            "item_id": item_id,
-            "client_id": client_id,
-            "quantity": qty,
-            "total_price": qty * unit_price,
-            "anomaly_score": anomaly_score,
-            "is_flagged": is_flagged
-        }
-
-        save_success = self.db.insert_transaction(final_payload)
+        # The stock check reserved the quantity; it is handed back unless
+        # the fact row commits, including when scoring or the insert raises
+        save_success = False
+        try:
+            scored_price, anomaly_score = anomaly_future.result()
+            if scored_price != unit_price:
+                # Cached price was missing or stale; score the committed one
+                anomaly_score = self.ml.check_anomaly(qty, unit_price)
+            is_flagged = anomaly_score < 0
+            response["logs"]["ml_score"] = anomaly_score
+
+            # 6. Persistence (Save to DB)
+            final_payload = {
+                "item_id": item_id,
+                "client_id": client_id,
+                "quantity": qty,
+                "total_price": qty * unit_price,
+                "anomaly_score": anomaly_score,
+                "is_flagged": is_flagged
+            }
+
+            save_success = self.db.insert_transaction(final_payload)
+        finally:
+            if not save_success:
+                self.logic.release_stock(item_id, qty)
 
         if save_success:
             # --- [NEW] LOCK THE HASH ---
@@ -1,14 +1,29 @@
 # validator.py
+from operator import itemgetter
 from typing import Dict, Any, List, Tuple
 
+_REQUIRED_FIELDS = ('item', 'client', 'qty')
+
+# Canned reject messages, built once; each call returns a fresh list
+_MISSING = {f: f"Missing required field: '{f}'" for f in _REQUIRED_FIELDS}
+_NONE = {f: f"Field '{f}' cannot be None." for f in _REQUIRED_FIELDS}
+
+_get_fields = itemgetter(*_REQUIRED_FIELDS)
+
+# (field, exact type, message) in _REQUIRED_FIELDS order; "{}" receives the offending type's name
+_TYPE_RULES = (
+    ('item', str, "Item name must be a string."),
+    ('client', str, "Client name must be a string."),
+    ('qty', int, "Quantity must be an integer. Got {}."),
+)
+
 class DataValidator:
     """
     The first line of defense.
     Validates structural integrity, data types, and basic constraints.
     Does NOT check the database (that comes in Phase 5).
     """
-    def __init__(self):
-        self.required_fields = ['item', 'client', 'qty']
+    required = frozenset(_REQUIRED_FIELDS)
 
     def validate_structure(self, data: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """
@@ -20,38 +35,34 @@ class DataValidator:
         Returns:
             Tuple (is_valid: bool, errors: List[str])
         """
-        errors = []
-        
         if not data:
             return False, ["Input data is empty or None."]
 
-        # 1. Check Required Fields
-        for field in self.required_fields:
-            if field not in data:
-                errors.append(f"Missing required field: '{field}'")
-            elif data[field] is None:
-                errors.append(f"Field '{field}' cannot be None.")
+        # 1. Check Required Fields (one set difference against the keys view)
+        missing = self.required - data.keys()
+        if missing:
+            return False, [_MISSING[f] for f in _REQUIRED_FIELDS if f in missing]
 
-        if errors:
-            return False, errors
+        values = _get_fields(data)
+        for field, value in zip(_REQUIRED_FIELDS, values):
+            if value is None:
+                return False, [_NONE[field]]
+
+        errors = []
 
         # 2. Type & Value Validation
-        # Validate Quantity
-        try:
-            qty = data['qty']
-            if not isinstance(qty, int):
-                errors.append(f"Quantity must be an integer. Got {type(qty).__name__}.")
-            elif qty <= 0:
-                errors.append(f"Quantity must be positive. Got {qty}.")
-        except Exception:
-            errors.append("Critical error validating quantity.")
-
-        # Validate Strings
-        if not isinstance(data.get('item'), str):
-            errors.append("Item name must be a string.")
-        
-        if not isinstance(data.get('client'), str):
-            errors.append("Client name must be a string.")
+        # Exact type checks: bool subclasses int, so isinstance(True, int) would
+        # accept {"qty": true} as a quantity of 1 (type(True) is bool, not int).
+        # JSON never yields other subclasses of these built-ins.
+        for (field, expected, message), value in zip(_TYPE_RULES, values):
+            value_type = type(value)
+            if value_type is not expected:
+                errors.append(message.format(value_type.__name__))
+
+        # Validate Quantity range
+        qty = values[2]
+        if type(qty) is int and qty <= 0:
+            errors.append(f"Quantity must be positive. Got {qty}.")
 
         # Final Decision
         is_valid = len(errors) == 0
@@ -75,4 +86,9 @@ if __name__ == "__main__":
     # Test 3: Missing Field
     missing_field = {"qty": 5, "client": "TechCorp"}
     success, errs = validator.validate_structure(missing_field)
-    print(f"Test 3 (Missing Item): {'PASS' if not success else 'FAIL'} -> Errors: {errs}")
\ No newline at end of file
+    print(f"Test 3 (Missing Item): {'PASS' if not success else 'FAIL'} -> Errors: {errs}")
+
+    # Test 4: Boolean Qty (bool is an int subclass; must still be rejected)
+    bool_qty = {"item": "Dell XPS", "qty": True, "client": "TechCorp"}
+    success, errs = validator.validate_structure(bool_qty)
+    print(f"Test 4 (Boolean Qty): {'PASS' if not success else 'FAIL'} -> Errors: {errs}")
\ No newline at end of file